@@ -5,173 +5,197 @@ with deliberate discrepancies to illustrate semantic layer challenges.
 
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import random
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 
-# Seed for reproducibility
-np.random.seed(42)
-random.seed(42)
+# Single PCG64 generator for reproducibility; every column is drawn in one call
+rng = np.random.default_rng(42)
 
 # Constants
-SUPPLIERS = [
-    {"id": f"SUP{i:03d}", "name": f"Supplier {chr(65 + (i % 26))}{i}", "region": ["Europe", "Asia", "Americas", "Other"][i % 4]}
-    for i in range(1, 21)
-]
+SUPPLIER_NUMS = np.arange(1, 21)
+SUPPLIER_IDS = np.array([f"SUP{i:03d}" for i in SUPPLIER_NUMS])
+SUPPLIER_NAMES = np.array([f"Supplier {chr(65 + (i % 26))}{i}" for i in SUPPLIER_NUMS])
+SUPPLIER_REGIONS = np.array(["Europe", "Asia", "Americas", "Other"])[SUPPLIER_NUMS % 4]
 
-QUARTERS = ["Q1", "Q2", "Q3", "Q4"]
-QUARTER_DATES = {
-    "Q1": (datetime(2025, 1, 1), datetime(2025, 3, 31)),
-    "Q2": (datetime(2025, 4, 1), datetime(2025, 6, 30)),
-    "Q3": (datetime(2025, 7, 1), datetime(2025, 9, 30)),
-    "Q4": (datetime(2025, 10, 1), datetime(2025, 12, 31)),
-}
+QUARTERS = np.array(["Q1", "Q2", "Q3", "Q4"])
+QUARTER_STARTS = np.array(["2025-01-01", "2025-04-01", "2025-07-01", "2025-10-01"], dtype="datetime64[D]")
+QUARTER_ENDS = np.array(["2025-03-31", "2025-06-30", "2025-09-30", "2025-12-31"], dtype="datetime64[D]")
+QUARTER_DAYS = (QUARTER_ENDS - QUARTER_STARTS).astype(int)
+
+
+def _group_positions(counts):
+    """Position of each expanded row within its group (0, 1, ... per group)."""
+    starts = np.cumsum(counts) - counts
+    return np.arange(counts.sum()) - np.repeat(starts, counts)
+
+
+def _join(*parts):
+    """Concatenate string arrays (or scalars) element-wise."""
+    out = parts[0]
+    for part in parts[1:]:
+        out = np.char.add(out, part)
+    return out
+
+
+def _seq(values, width):
+    """Zero-padded sequence numbers as strings."""
+    return np.char.zfill(values.astype(str), width)
+
+
+def _random_dates(year, months, days):
+    """Dates in ``year`` for arrays of month/day numbers."""
+    return (np.datetime64(f"{year}-01", "M") + (months - 1)).astype("datetime64[D]") + (days - 1)
+
+
+def _write_table(df, name):
+    """Write data/system_<name>.parquet and a CSV export of the same Arrow table."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, f"data/system_{name}.parquet", compression="zstd")
+    # Export copy for inspection; dates are written as plain YYYY-MM-DD
+    csv_table = table.cast(pa.schema([
+        pa.field(field.name, pa.date32()) if pa.types.is_timestamp(field.type) else field
+        for field in table.schema
+    ]))
+    pacsv.write_csv(csv_table, f"data/system_{name}.csv", write_options=pacsv.WriteOptions(batch_size=65536))
+
+
+def _supplier_columns(sup):
+    """supplier_id / supplier_name / region columns for supplier indices."""
+    return {
+        "supplier_id": SUPPLIER_IDS[sup],
+        "supplier_name": SUPPLIER_NAMES[sup],
+        "region": SUPPLIER_REGIONS[sup],
+    }
 
 
 def generate_vgs_data():
     """Generate VGS (Supplier Governance) data"""
-    records = []
-    
-    for supplier in SUPPLIERS:
-        # Each supplier has 1-3 contracts
-        num_contracts = random.randint(1, 3)
-        
-        for c in range(num_contracts):
-            contract_id = f"VGS-{supplier['id']}-{c+1:02d}"
-            contract_start = datetime(2024, random.randint(1, 12), random.randint(1, 28))
-            contract_end = datetime(2025, random.randint(7, 12), random.randint(1, 28))
-            
-            original_value = random.uniform(500000, 5000000)
-            amendment_value = random.uniform(0, original_value * 0.3)  # 0-30% amendment
-            prior_contract_price = random.uniform(100, 500)  # Unit price from prior contract
-            
-            # Generate delivery events across quarters
-            for quarter in QUARTERS:
-                q_start, q_end = QUARTER_DATES[quarter]
-                num_deliveries = random.randint(2, 8)
-                
-                for d in range(num_deliveries):
-                    delivery_date = q_start + timedelta(days=random.randint(0, (q_end - q_start).days))
-                    agreed_window_start = delivery_date - timedelta(days=random.randint(0, 5))
-                    agreed_window_end = delivery_date + timedelta(days=random.randint(0, 3))
-                    
-                    # VGS excludes partial deliveries from on-time count
-                    is_partial = random.random() < 0.15  # 15% partial deliveries
-                    force_majeure = random.random() < 0.05  # 5% force majeure
-                    
-                    records.append({
-                        "supplier_id": supplier["id"],
-                        "supplier_name": supplier["name"],
-                        "region": supplier["region"],
-                        "contract_id": contract_id,
-                        "contract_start": contract_start.strftime("%Y-%m-%d"),
-                        "contract_end": contract_end.strftime("%Y-%m-%d"),
-                        "original_value": round(original_value, 2),
-                        "amendment_value": round(amendment_value, 2),
-                        "prior_contract_price": round(prior_contract_price, 2),
-                        "delivery_date": delivery_date.strftime("%Y-%m-%d"),
-                        "agreed_window_start": agreed_window_start.strftime("%Y-%m-%d"),
-                        "agreed_window_end": agreed_window_end.strftime("%Y-%m-%d"),
-                        "is_partial_delivery": is_partial,
-                        "force_majeure_flag": force_majeure,
-                        "quarter": quarter,
-                    })
-    
-    df = pd.DataFrame(records)
-    df.to_csv("data/system_vgs.csv", index=False)
+    # Each supplier has 1-3 contracts
+    contracts_per_sup = rng.integers(1, 4, len(SUPPLIER_IDS))
+    contract_sup = np.repeat(np.arange(len(SUPPLIER_IDS)), contracts_per_sup)
+    n_contracts = len(contract_sup)
+    contract_ids = _join("VGS-", SUPPLIER_IDS[contract_sup], "-", _seq(_group_positions(contracts_per_sup) + 1, 2))
+    contract_start = _random_dates(2024, rng.integers(1, 13, n_contracts), rng.integers(1, 29, n_contracts))
+    contract_end = _random_dates(2025, rng.integers(7, 13, n_contracts), rng.integers(1, 29, n_contracts))
+
+    original_value = rng.uniform(500000, 5000000, n_contracts)
+    amendment_value = rng.uniform(0, original_value * 0.3)  # 0-30% amendment
+    prior_contract_price = rng.uniform(100, 500, n_contracts)  # Unit price from prior contract
+
+    # Delivery events: 2-8 per (contract, quarter), expanded contract-major
+    deliveries = rng.integers(2, 9, n_contracts * len(QUARTERS))
+    contract = np.repeat(np.repeat(np.arange(n_contracts), len(QUARTERS)), deliveries)
+    quarter = np.repeat(np.tile(np.arange(len(QUARTERS)), n_contracts), deliveries)
+    n = len(contract)
+
+    delivery_date = QUARTER_STARTS[quarter] + rng.integers(0, QUARTER_DAYS[quarter] + 1)
+    agreed_window_start = delivery_date - rng.integers(0, 6, n)
+    agreed_window_end = delivery_date + rng.integers(0, 4, n)
+
+    # VGS excludes partial deliveries from on-time count
+    is_partial = rng.random(n) < 0.15  # 15% partial deliveries
+    force_majeure = rng.random(n) < 0.05  # 5% force majeure
+
+    df = pd.DataFrame({
+        **_supplier_columns(contract_sup[contract]),
+        "contract_id": contract_ids[contract],
+        "contract_start": contract_start[contract],
+        "contract_end": contract_end[contract],
+        "original_value": original_value[contract].round(2),
+        "amendment_value": amendment_value[contract].round(2),
+        "prior_contract_price": prior_contract_price[contract].round(2),
+        "delivery_date": delivery_date,
+        "agreed_window_start": agreed_window_start,
+        "agreed_window_end": agreed_window_end,
+        "is_partial_delivery": is_partial,
+        "force_majeure_flag": force_majeure,
+        "quarter": QUARTERS[quarter],
+    })
     print(f"Generated VGS data: {len(df)} records")
     return df
 
 
 def generate_vpc_data():
     """Generate VPC (Price/Cost Management) data"""
-    records = []
-    
-    for supplier in SUPPLIERS:
-        # Each supplier has contracts in VPC
-        num_contracts = random.randint(1, 2)
-        
-        for c in range(num_contracts):
-            contract_id = f"VPC-{supplier['id']}-{c+1:02d}"
-            original_contract_value = random.uniform(500000, 5000000)
-            
-            # VPC uses list price as baseline (inflated)
-            list_price = random.uniform(150, 600)
-            unit_price = list_price * random.uniform(0.7, 0.95)  # 5-30% discount from list
-            negotiated_discount_pct = (1 - unit_price / list_price) * 100
-            
-            for quarter in QUARTERS:
-                volume = random.uniform(1000, 10000)
-                
-                records.append({
-                    "supplier_id": supplier["id"],
-                    "supplier_name": supplier["name"],
-                    "region": supplier["region"],
-                    "contract_id": contract_id,
-                    "original_contract_value": round(original_contract_value, 2),
-                    "unit_price": round(unit_price, 2),
-                    "list_price": round(list_price, 2),
-                    "volume": round(volume, 0),
-                    "negotiated_discount_pct": round(negotiated_discount_pct, 2),
-                    "quarter": quarter,
-                })
-    
-    df = pd.DataFrame(records)
-    df.to_csv("data/system_vpc.csv", index=False)
+    # Each supplier has 1-2 contracts in VPC
+    contracts_per_sup = rng.integers(1, 3, len(SUPPLIER_IDS))
+    contract_sup = np.repeat(np.arange(len(SUPPLIER_IDS)), contracts_per_sup)
+    n_contracts = len(contract_sup)
+    contract_ids = _join("VPC-", SUPPLIER_IDS[contract_sup], "-", _seq(_group_positions(contracts_per_sup) + 1, 2))
+    original_contract_value = rng.uniform(500000, 5000000, n_contracts)
+
+    # VPC uses list price as baseline (inflated)
+    list_price = rng.uniform(150, 600, n_contracts)
+    unit_price = list_price * rng.uniform(0.7, 0.95, n_contracts)  # 5-30% discount from list
+    negotiated_discount_pct = (1 - unit_price / list_price) * 100
+
+    # One row per (contract, quarter)
+    contract = np.repeat(np.arange(n_contracts), len(QUARTERS))
+    quarter = np.tile(np.arange(len(QUARTERS)), n_contracts)
+    volume = rng.uniform(1000, 10000, len(contract))
+
+    df = pd.DataFrame({
+        **_supplier_columns(contract_sup[contract]),
+        "contract_id": contract_ids[contract],
+        "original_contract_value": original_contract_value[contract].round(2),
+        "unit_price": unit_price[contract].round(2),
+        "list_price": list_price[contract].round(2),
+        "volume": volume.round(0),
+        "negotiated_discount_pct": negotiated_discount_pct[contract].round(2),
+        "quarter": QUARTERS[quarter],
+    })
     print(f"Generated VPC data: {len(df)} records")
     return df
 
 
 def generate_si_data():
     """Generate SI+ (Implementation Tracking) data"""
-    records = []
-    
-    for supplier in SUPPLIERS:
-        for quarter in QUARTERS:
-            q_start, q_end = QUARTER_DATES[quarter]
-            num_deliveries = random.randint(3, 10)
-            
-            for d in range(num_deliveries):
-                delivery_id = f"SI-{supplier['id']}-{quarter}-{d+1:03d}"
-                scheduled_date = q_start + timedelta(days=random.randint(0, (q_end - q_start).days))
-                
-                # SI+ counts partial deliveries as on-time if received
-                is_partial = random.random() < 0.15
-                # Actual receipt can be early, on-time, or late
-                days_offset = random.randint(-2, 5)
-                actual_receipt_date = scheduled_date + timedelta(days=days_offset)
-                
-                # Status based on receipt timing
-                if actual_receipt_date <= scheduled_date + timedelta(days=1):
-                    status = "RECEIVED"
-                elif actual_receipt_date <= scheduled_date + timedelta(days=3):
-                    status = "LATE"
-                else:
-                    status = "DELAYED"
-                
-                committed_spend = random.uniform(50000, 500000)
-                
-                records.append({
-                    "supplier_id": supplier["id"],
-                    "supplier_name": supplier["name"],
-                    "region": supplier["region"],
-                    "delivery_id": delivery_id,
-                    "scheduled_date": scheduled_date.strftime("%Y-%m-%d"),
-                    "actual_receipt_date": actual_receipt_date.strftime("%Y-%m-%d"),
-                    "status": status,
-                    "is_partial": is_partial,
-                    "committed_spend": round(committed_spend, 2),
-                    "quarter": quarter,
-                })
-    
-    df = pd.DataFrame(records)
-    df.to_csv("data/system_si.csv", index=False)
+    # 3-10 deliveries per (supplier, quarter), expanded supplier-major
+    deliveries = rng.integers(3, 11, len(SUPPLIER_IDS) * len(QUARTERS))
+    sup = np.repeat(np.repeat(np.arange(len(SUPPLIER_IDS)), len(QUARTERS)), deliveries)
+    quarter = np.repeat(np.tile(np.arange(len(QUARTERS)), len(SUPPLIER_IDS)), deliveries)
+    n = len(sup)
+
+    delivery_ids = _join("SI-", SUPPLIER_IDS[sup], "-", QUARTERS[quarter], "-", _seq(_group_positions(deliveries) + 1, 3))
+    scheduled_date = QUARTER_STARTS[quarter] + rng.integers(0, QUARTER_DAYS[quarter] + 1)
+
+    # SI+ counts partial deliveries as on-time if received
+    is_partial = rng.random(n) < 0.15
+    # Actual receipt can be early, on-time, or late
+    days_offset = rng.integers(-2, 6, n)
+    actual_receipt_date = scheduled_date + days_offset
+
+    # Status based on receipt timing
+    status = np.select([days_offset <= 1, days_offset <= 3], ["RECEIVED", "LATE"], "DELAYED")
+
+    committed_spend = rng.uniform(50000, 500000, n)
+
+    df = pd.DataFrame({
+        **_supplier_columns(sup),
+        "delivery_id": delivery_ids,
+        "scheduled_date": scheduled_date,
+        "actual_receipt_date": actual_receipt_date,
+        "status": status,
+        "is_partial": is_partial,
+        "committed_spend": committed_spend.round(2),
+        "quarter": QUARTERS[quarter],
+    })
     print(f"Generated SI+ data: {len(df)} records")
     return df
 
 
 if __name__ == "__main__":
     print("Generating synthetic procurement data...")
-    generate_vgs_data()
-    generate_vpc_data()
-    generate_si_data()
+    # Generated in order so the shared rng stream stays reproducible
+    tables = {
+        "vgs": generate_vgs_data(),
+        "vpc": generate_vpc_data(),
+        "si": generate_si_data(),
+    }
+    # Writes overlap; pyarrow releases the GIL while encoding and writing
+    with ThreadPoolExecutor(max_workers=len(tables)) as pool:
+        for future in [pool.submit(_write_table, df, name) for name, df in tables.items()]:
+            future.result()
     print("Data generation complete!")
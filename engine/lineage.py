@@ -3,6 +3,9 @@
 from graphviz import Digraph
 
 
+LINEAGE_METRICS = ("Supplier On-Time Delivery Rate", "Negotiated Savings", "Active Contract Value")
+
+
 def create_lineage_diagram(metric_name):
     """Create a Graphviz DAG showing metric lineage."""
     dot = Digraph(comment=metric_name)
@@ -106,3 +109,13 @@ def create_lineage_diagram(metric_name):
         dot.edge('agg', 'metric')
     
     return dot
+
+
+# DOT source for every governed metric, built once on first import
+_LINEAGE_SOURCES = {name: create_lineage_diagram(name).source for name in LINEAGE_METRICS}
+
+
+def get_lineage_source(metric_name):
+    """Return the DOT source of a metric's lineage diagram."""
+    source = _LINEAGE_SOURCES.get(metric_name)
+    return source if source is not None else create_lineage_diagram(metric_name).source
@@ -1,55 +1,97 @@
-"""Load CSV data and parse YAML metric definitions."""
+"""Load source system data and parse YAML metric definitions."""
 
+import html
 import pandas as pd
+import streamlit as st
 import yaml
 from pathlib import Path
 
 
+DATA_DIR = Path(__file__).parent.parent / "data"
+SOURCE_FILES = {name: DATA_DIR / f"system_{name}.parquet" for name in ("vgs", "vpc", "si")}
+
+
+def _data_version():
+    """Token that changes whenever a source Parquet file is rewritten."""
+    return ":".join(str(path.stat().st_mtime_ns) for path in SOURCE_FILES.values())
+
+
+# Cache key for results derived from the source tables. Read once at import,
+# so a restarted app that finds regenerated data gets new keys; the compute
+# entry points pass it explicitly to their cached implementations.
+DATA_VERSION = _data_version()
+
+CATEGORY_COLS = ["supplier_id", "region", "status"]
+QUARTER_DTYPE = pd.CategoricalDtype(["Q1", "Q2", "Q3", "Q4"], ordered=True)
+# Amounts stay float64: they are summed and shown to the cent, which float32
+# cannot hold at contract-value magnitudes
+FLOAT32_COLS = ["volume", "negotiated_discount_pct"]
+
+
+@st.cache_resource(show_spinner=False)
 def load_system_data():
-    """Load all three source system CSVs."""
-    base_path = Path(__file__).parent.parent
-    
-    vgs = pd.read_csv(base_path / "data" / "system_vgs.csv")
-    vpc = pd.read_csv(base_path / "data" / "system_vpc.csv")
-    si = pd.read_csv(base_path / "data" / "system_si.csv")
-    
-    # Convert date columns
-    date_cols_vgs = ["contract_start", "contract_end", "delivery_date", "agreed_window_start", "agreed_window_end"]
-    for col in date_cols_vgs:
-        if col in vgs.columns:
-            vgs[col] = pd.to_datetime(vgs[col], errors='coerce')
+    """Load all three source system tables from Parquet (dates and booleans are stored typed).
+
+    Cached as a shared resource so every caller gets the same frames without
+    a per-call copy; callers must not modify them in place.
+    """
+    vgs = pd.read_parquet(SOURCE_FILES["vgs"], engine="pyarrow")
+    vpc = pd.read_parquet(SOURCE_FILES["vpc"], engine="pyarrow")
+    si = pd.read_parquet(SOURCE_FILES["si"], engine="pyarrow")
     
-    date_cols_si = ["scheduled_date", "actual_receipt_date"]
-    for col in date_cols_si:
-        if col in si.columns:
-            si[col] = pd.to_datetime(si[col], errors='coerce')
+    # Per-row values every metric call would otherwise recompute
+    vgs["is_on_time_vgs"] = (
+        (vgs["delivery_date"] >= vgs["agreed_window_start"]) &
+        (vgs["delivery_date"] <= vgs["agreed_window_end"])
+    )
+    vgs["total_value"] = vgs["original_value"] + vgs["amendment_value"]
     
-    # Convert boolean columns
-    bool_cols_vgs = ["is_partial_delivery", "force_majeure_flag"]
-    for col in bool_cols_vgs:
-        if col in vgs.columns:
-            vgs[col] = vgs[col].astype(bool)
+    # Narrow dtypes: category codes for filter/group keys, float32 for quantities
+    for df in (vgs, vpc, si):
+        for col in CATEGORY_COLS:
+            if col in df.columns:
+                df[col] = df[col].astype("category")
+        df["quarter"] = df["quarter"].astype(QUARTER_DTYPE)
+        for col in FLOAT32_COLS:
+            if col in df.columns:
+                df[col] = df[col].astype("float32")
     
-    bool_cols_si = ["is_partial"]
-    for col in bool_cols_si:
-        if col in si.columns:
-            si[col] = si[col].astype(bool)
+    # First VGS row per (supplier, region, quarter): the window, exclusion
+    # flags and prior price the governed metrics pair with SI+/VPC rows. It
+    # keeps the quarter/region columns and the original row order, so after
+    # the usual filters the first row left per supplier is the first one in
+    # the filtered VGS data.
+    vgs_supplier = vgs.drop_duplicates(["supplier_id", "region", "quarter"])[[
+        "supplier_id", "region", "quarter", "agreed_window_start", "agreed_window_end",
+        "is_partial_delivery", "force_majeure_flag", "prior_contract_price",
+    ]].reset_index(drop=True)
     
-    return {"vgs": vgs, "vpc": vpc, "si": si}
+    return {"vgs": vgs, "vpc": vpc, "si": si, "vgs_supplier": vgs_supplier}
 
 
+def _html_list_items(items):
+    """Render a list of strings as escaped <li> elements."""
+    return "".join(f"<li>{html.escape(item)}</li>" for item in items)
+
+
+@st.cache_resource(show_spinner=False)
 def load_metric_definitions():
-    """Load and parse metric definitions from YAML."""
+    """Load and parse metric definitions from YAML (read once per process)."""
     base_path = Path(__file__).parent.parent
     yaml_path = base_path / "metrics" / "definitions.yml"
     
     with open(yaml_path, 'r') as f:
         data = yaml.safe_load(f)
     
+    # Pre-render the static list fragments shown in the definition card
+    for metric in data["metrics"]:
+        metric["_inclusions_html"] = _html_list_items(metric["inclusions"])
+        metric["_exclusions_html"] = _html_list_items(metric["exclusions"])
+        metric["_sources_html"] = _html_list_items(metric.get("authoritative_source", []))
+    
     return {metric["name"]: metric for metric in data["metrics"]}
 
 
 def get_metric_by_name(name):
     """Get a specific metric definition by name."""
-    definitions = load_metric_definitions()
-    return definitions.get(name)
+    return load_metric_definitions().get(name)